@@ -1,9 +1,11 @@
 import os
 import gc
+import asyncio
 import json
 import base64
 from datetime import datetime
 from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, redirect, jsonify
 from flask_cors import CORS
 import time
@@ -34,6 +36,10 @@ from telegram.error import Conflict, NetworkError, TelegramError
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 
+from status_watcher import StatusWatcher
+from loop_watchdog import LoopWatchdog
+from duplicate_index import DuplicateIndex
+
 # ====== Secure Logging ======
 class NoSensitiveFilter(logging.Filter):
     SENSITIVE_PATTERNS = [
@@ -76,7 +82,8 @@ class RateLimiter:
         self.requests = defaultdict(deque)
         self.lock = Lock()
     
-    def is_allowed(self, user_id):
+    def is_allowed(self, user_id, count=1):
+        """จอง count request พร้อมกันทั้งหมด หรือไม่จองเลยถ้าโควตาเหลือไม่พอ"""
         with self.lock:
             now = time.time()
             user_requests = self.requests[user_id]
@@ -84,8 +91,8 @@ class RateLimiter:
             while user_requests and user_requests[0] < now - self.time_window:
                 user_requests.popleft()
             
-            if len(user_requests) < self.max_requests:
-                user_requests.append(now)
+            if len(user_requests) + count <= self.max_requests:
+                user_requests.extend([now] * count)
                 return True
             
             return False
@@ -94,16 +101,32 @@ rate_limiter = RateLimiter(max_requests=3, time_window=60)
 
 # ====== Google Sheet Manager ======
 class LightweightSheetManager:
-    def __init__(self):
+    CONNECT_REQUESTS = 3  # open spreadsheet (2) + worksheet (1)
+    CONNECT_BUDGET_WAIT = 30
+    
+    def __init__(self, spreadsheet_title, worksheet_title, throttle=None):
+        self.spreadsheet_title = spreadsheet_title
+        self.worksheet_title = worksheet_title
+        self.throttle = throttle
+        self.spreadsheet = None
         self.sheet = None
         self.last_connect = None
         self.connect_interval = 300
         self._lock = Lock()
     
+    def _is_fresh(self, now):
+        return self.sheet and self.last_connect and (now - self.last_connect < self.connect_interval)
+    
     def get_sheet(self):
+        # จองโควตาก่อนถือ lock เพื่อไม่ให้ caller อื่นต้องรอโควตาไปด้วย
+        if self.throttle and not self._is_fresh(time.time()):
+            if not self.throttle(count=self.CONNECT_REQUESTS, timeout=self.CONNECT_BUDGET_WAIT):
+                logger.warning(f"Sheets budget exhausted, reconnect postponed: {self.spreadsheet_title}")
+                return self.sheet
+        
         with self._lock:
             now = time.time()
-            if self.sheet and self.last_connect and (now - self.last_connect < self.connect_interval):
+            if self._is_fresh(now):
                 return self.sheet
             
             try:
@@ -118,23 +141,139 @@ class LightweightSheetManager:
                 creds = ServiceAccountCredentials.from_json_keyfile_dict(credentials_info, scope)
                 
                 client = gspread.authorize(creds)
-                self.sheet = client.open("เครดิตฟรี กลุ่ม กิจกรรม ZOMBIE").worksheet("ข้อมูลลูกค้า")
+                self.spreadsheet = client.open(self.spreadsheet_title)
+                self.sheet = self.spreadsheet.worksheet(self.worksheet_title)
                 self.last_connect = now
                 
-                logger.info("Google Sheets connected successfully")
+                logger.info(f"Google Sheets connected successfully: {self.spreadsheet_title}")
                 return self.sheet
                 
             except Exception as e:
                 logger.error(f"Sheet connection failed: {type(e).__name__}")
                 return None
-
-sheet_manager = LightweightSheetManager()
+    
+    def get_data_sheets(self):
+        """worksheet ข้อมูลทั้งหมด (ข้อมูลลูกค้า, ข้อมูลลูกค้า_2, ...)"""
+        if not self.get_sheet():
+            return []
+        return [ws for ws in self.spreadsheet.worksheets() if ws.title.startswith(self.worksheet_title)]
 
 # ====== Config ======
 ASK_INFO = range(1)
-GROUP_ID = -1002561643127
-pending_saves = deque(maxlen=100)
-failed_saves = deque(maxlen=50)
+loop_watchdog = LoopWatchdog(interval=0.1, threshold=1.0)
+STATUS_POLL_INTERVAL = 60
+STATUS_BUDGET_WAIT = 30  # ถ้ารอโควตานานกว่านี้ ข้ามรอบตรวจสถานะไป
+CONNECTION_POOL_SIZE = 8
+POOL_TIMEOUT = 30.0
+REDIRECT_BASE_URL = "https://activate-creditfree.slotzombies.net/go"
+HOUSE_UPDATE_BUDGET_WAIT = 10
+DUPLICATE_COLUMN = 14  # N: ข้อมูลซ้ำ (แยกจาก L ที่ /go เขียนบ้านล่าสุดทับ)
+
+# ====== Campaigns ======
+# ใช้เมื่อไม่มีไฟล์ CAMPAIGNS_FILE (ค่าเดิมของกิจกรรม ZOMBIE)
+DEFAULT_CAMPAIGN = {
+    "key": "zombie",
+    "spreadsheet": "เครดิตฟรี กลุ่ม กิจกรรม ZOMBIE",
+    "worksheet": "ข้อมูลลูกค้า",
+    "group_id": -1002561643127,
+    "welcome_message": (
+        "🎉 ยินดีต้อนรับเข้าสู่ระบบยืนยันตัวตน ZOMBIE SLOT - กิจกรรม \n\n"
+        "📌 กรุณาก๊อปข้อความด้านล่างนี้แล้วเติมข้อมูลให้ครบทุกช่อง \n\n"
+        "ชื่อ - นามสกุล : \n"
+        "เบอร์โทร : \n"
+        "ธนาคาร : \n"
+        "เลขบัญชี : \n"
+        "อีเมล : \n"
+        "ชื่อเทเลแกรม : \n"
+        "@username Telegram :"
+    ),
+    "houses": [
+        {"key": "ZOMBIE_XO",   "label": "💀 ZOMBIE XO",   "link": "https://lin.ee/SgguCbJ"},
+        {"key": "ZOMBIE_PG",   "label": "👾 ZOMBIE PG",   "link": "https://lin.ee/ETELgrN"},
+        {"key": "ZOMBIE_KING", "label": "👑 ZOMBIE KING", "link": "https://lin.ee/fJilKIf"},
+        {"key": "ZOMBIE_ALL",  "label": "🧟 ZOMBIE ALL",  "link": "https://lin.ee/9eogsb8e"},
+        {"key": "GENBU88",     "label": "🐢 GENBU88",     "link": "https://lin.ee/JCCXt06"}
+    ],
+    "sheets_requests_per_minute": 60,
+    "sheet_workers": 2
+}
+
+class Campaign:
+    """กิจกรรมหนึ่งรายการ: spreadsheet, กลุ่ม, บ้าน และ worker/คิว/โควตา Sheets ของตัวเอง"""
+
+    def __init__(self, config):
+        self.key = config["key"]
+        self.spreadsheet = config["spreadsheet"]
+        self.worksheet = config.get("worksheet", DEFAULT_CAMPAIGN["worksheet"])
+        self.group_id = int(config["group_id"])
+        self.welcome_message = config.get("welcome_message", DEFAULT_CAMPAIGN["welcome_message"])
+        self.houses = [(house["label"], house["key"].upper()) for house in config["houses"]]
+        self.house_links = {house["key"].upper(): house["link"] for house in config["houses"]}
+
+        # แยกทรัพยากรต่อกิจกรรม เพื่อไม่ให้กิจกรรมที่คนเยอะแย่งโควตา/คิวของกิจกรรมอื่น
+        self.sheets_budget = RateLimiter(
+            max_requests=config.get("sheets_requests_per_minute", DEFAULT_CAMPAIGN["sheets_requests_per_minute"]),
+            time_window=60
+        )
+        self.sheet_manager = LightweightSheetManager(self.spreadsheet, self.worksheet, throttle=self.wait_for_budget)
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.get("sheet_workers", DEFAULT_CAMPAIGN["sheet_workers"]),
+            thread_name_prefix=f"sheets-{self.key}"
+        )
+        # ไม่จำกัดขนาดโดยค่าเริ่มต้น: การลงทะเบียนที่เกินโควตาต้องไม่หาย
+        self.pending_saves = deque(maxlen=config.get("pending_queue_size"))
+        self.pending_lock = Lock()  # กันไม่ให้แก้แถวในคิวขณะที่ retry thread กำลังบันทึกแถวนั้น
+        self.save_failures = 0
+        self.dropped_saves = 0
+        self.status_watcher = StatusWatcher(page_size=500)
+        self.duplicate_index = DuplicateIndex()
+
+    def get_sheet(self):
+        return self.sheet_manager.get_sheet()
+
+    def wait_for_budget(self, count=1, timeout=None):
+        """จองโควตา Sheets count request รอได้ไม่เกิน timeout วินาที (None = รอจนได้)
+
+        เรียกก่อนทุก Sheets API call และใช้ใน thread เท่านั้น (ห้ามเรียกบน event loop)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.sheets_budget.is_allowed(self.key, count):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(1)
+        return True
+
+    def enqueue(self, queue, user_data, front=False):
+        """เพิ่มเข้าคิว (front = ใส่กลับหัวคิว) ถ้าคิวเต็มจะมีรายการหลุด จึงนับและ log ไว้ทุกครั้ง"""
+        if queue.maxlen is not None and len(queue) >= queue.maxlen:
+            self.dropped_saves += 1
+            logger.error(f"Queue full for campaign {self.key}: dropped a registration ({self.dropped_saves} total)")
+        if front:
+            queue.appendleft(user_data)
+        else:
+            queue.append(user_data)
+
+    async def run_in_worker(self, func, *args):
+        """รันงาน Sheets (blocking) ใน worker pool ของกิจกรรมนี้"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+def load_campaigns():
+    path = os.getenv("CAMPAIGNS_FILE", "campaigns.json")
+    if not os.path.exists(path):
+        configs = [DEFAULT_CAMPAIGN]
+    else:
+        with open(path, encoding="utf-8") as f:
+            configs = json.load(f)
+
+    loaded = {}
+    for config in configs:
+        campaign = Campaign(config)
+        loaded[campaign.key] = campaign
+    logger.info(f"Loaded {len(loaded)} campaign(s): {', '.join(loaded)}")
+    return loaded
+
+campaigns = load_campaigns()
+default_campaign = next(iter(campaigns.values()))
 
 def create_user_hash(user_id):
     return hashlib.md5(str(user_id).encode()).hexdigest()[:8]
@@ -146,9 +285,28 @@ def log_memory_usage(context=""):
     logger.info(f"Memory {context}: {memory_mb:.1f} MB")
     return memory_mb
 
-def update_house_in_sheet(uid, house):
+def save_registration(campaign, user_data):
+    # ไม่รอโควตาใน handler ถ้าหมดให้ retry thread บันทึกภายหลัง
+    if not campaign.wait_for_budget(timeout=0):
+        return False
+    sheet = campaign.get_sheet()
+    if not sheet:
+        return False
     try:
-        sheet = sheet_manager.get_sheet()
+        sheet.append_row(user_data)
+        return True
+    except Exception as e:
+        logger.error(f"Save failed for campaign {campaign.key}: {type(e).__name__}")
+        return False
+
+def update_house_in_sheet(campaign, uid, house):
+    try:
+        # get_all_records + update_cell 2 ครั้ง = 3 requests
+        if not campaign.wait_for_budget(count=3, timeout=HOUSE_UPDATE_BUDGET_WAIT):
+            logger.warning(f"Sheets budget exhausted for campaign {campaign.key}: house update skipped")
+            return False
+
+        sheet = campaign.get_sheet()
         if not sheet:
             return False
 
@@ -198,29 +356,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.warning(f"Rate limit exceeded for user {user_hash}")
         return ConversationHandler.END
     
-    logger.info(f"Start command from user {user_hash}")
+    # deep link: t.me/<bot>?start=<campaign key>
+    campaign = campaigns.get(context.args[0]) if context.args else None
+    campaign = campaign or default_campaign
+    context.user_data["campaign"] = campaign.key
+    logger.info(f"Start command from user {user_hash} ({campaign.key})")
     
-    welcome_message = (
-        "🎉 ยินดีต้อนรับเข้าสู่ระบบยืนยันตัวตน ZOMBIE SLOT - กิจกรรม \n\n"
-        "📌 กรุณาก๊อปข้อความด้านล่างนี้แล้วเติมข้อมูลให้ครบทุกช่อง \n\n"
-        "ชื่อ - นามสกุล : \n"
-        "เบอร์โทร : \n"
-        "ธนาคาร : \n"
-        "เลขบัญชี : \n"
-        "อีเมล : \n"
-        "ชื่อเทเลแกรม : \n"
-        "@username Telegram :"
-    )
     keyboard = [[KeyboardButton("เริ่มต้นส่งข้อมูล ✅")]]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(welcome_message, reply_markup=reply_markup)
+    await update.message.reply_text(campaign.welcome_message, reply_markup=reply_markup)
     return ASK_INFO
 
 async def get_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     user_hash = create_user_hash(user_id)
     text = update.message.text
+    campaign = campaigns.get(context.user_data.get("campaign"), default_campaign)
     
     if not rate_limiter.is_allowed(user_id):
         await update.message.reply_text("⏱️ กรุณารอสักครู่ก่อนส่งข้อมูลใหม่")
@@ -249,7 +401,7 @@ async def get_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Group check
     logger.info(f"Group check for user {user_hash}")
     try:
-        member = await context.bot.get_chat_member(chat_id=GROUP_ID, user_id=user_id)
+        member = await context.bot.get_chat_member(chat_id=campaign.group_id, user_id=user_id)
         in_group = member.status in ['member', 'administrator', 'creator']
         logger.info(f"Group check: {user_hash} -> {'MEMBER' if in_group else 'NOT_MEMBER'}")
     except Exception as e:
@@ -262,6 +414,16 @@ async def get_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     bangkok_tz = pytz.timezone('Asia/Bangkok')
     now = datetime.now(bangkok_tz).strftime("%Y-%m-%d %H:%M:%S")
     
+    # Duplicate check (เบอร์โทร / เลขบัญชี / อีเมล ที่เคยใช้กับ Telegram account อื่น)
+    duplicates = await campaign.run_in_worker(campaign.duplicate_index.check_and_add, {
+        "phone": data.get("เบอร์โทร", ""),
+        "account": data.get("เลขบัญชี", ""),
+        "email": data.get("อีเมล", "")
+    }, user_id, now)
+    if duplicates:
+        logger.warning(f"Duplicate registration from user {user_hash}: {', '.join(duplicates)}")
+    duplicate_flag = f"DUPLICATE ({', '.join(duplicates)})" if duplicates else ""
+    
     # Save to sheet
     user_data = [
         data.get("ชื่อ - นามสกุล", ""),
@@ -276,42 +438,23 @@ async def get_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status_text,
         now,
         "PENDING",
-        ""
+        "",
+        duplicate_flag
     ]
     
-    saved = False
-    sheet = sheet_manager.get_sheet()
-    if sheet:
-        try:
-            sheet.append_row(user_data)
-            saved = True
-            logger.info(f"Data saved for user {user_hash}")
-        except Exception as e:
-            logger.error(f"Save failed for user {user_hash}: {type(e).__name__}")
-    
-    if not saved:
-        pending_saves.append(user_data)
-        logger.warning(f"Added to pending queue: user {user_hash}")
+    saved = await campaign.run_in_worker(save_registration, campaign, user_data)
+    if saved:
+        logger.info(f"Data saved for user {user_hash}")
+    else:
+        campaign.enqueue(campaign.pending_saves, user_data)
+        logger.warning(f"Added to pending queue: user {user_hash} ({campaign.key})")
     
     # House selection buttons
-    house_keys = [
-        ("💀 ZOMBIE XO", "ZOMBIE_XO"),
-        ("👾 ZOMBIE PG", "ZOMBIE_PG"),
-        ("👑 ZOMBIE KING", "ZOMBIE_KING"),
-        ("🧟 ZOMBIE ALL", "ZOMBIE_ALL"),
-        ("🐢 GENBU88", "GENBU88")
-    ]
-    
     def build_url(house, uid):
-        return f"https://activate-creditfree.slotzombies.net/go?house={house}&uid={uid}"
-    
-    keyboard = [
-        [InlineKeyboardButton(text, url=build_url(house, user_id)) 
-         for text, house in house_keys[:2]],
-        [InlineKeyboardButton(text, url=build_url(house, user_id)) 
-         for text, house in house_keys[2:4]],
-        [InlineKeyboardButton(house_keys[4][0], url=build_url(house_keys[4][1], user_id))]
-    ]
+        return f"{REDIRECT_BASE_URL}?house={house}&uid={uid}&campaign={campaign.key}"
+    
+    buttons = [InlineKeyboardButton(text, url=build_url(house, user_id)) for text, house in campaign.houses]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
     
     first_name = data.get('ชื่อ - นามสกุล', 'ผู้ใช้').split()[0] if data.get('ชื่อ - นามสกุล') else 'ผู้ใช้'
     
@@ -355,66 +498,47 @@ def health_check():
     return {
         "status": "healthy" if memory_mb < 1500 else "warning",
         "memory_mb": round(memory_mb, 2),
-        "pending": len(pending_saves),
-        "failed": len(failed_saves),
+        "pending": sum(len(c.pending_saves) for c in campaigns.values()),
+        "failed": sum(c.save_failures for c in campaigns.values()),
+        "campaigns": {
+            key: {
+                "pending": len(c.pending_saves),
+                "failed": c.save_failures,
+                "dropped": c.dropped_saves,
+                "duplicate_index": {
+                    "ready": c.duplicate_index.ready,
+                    "build_failed": c.duplicate_index.build_failed,
+                    "deferred": c.duplicate_index.deferred,
+                    "entries": len(c.duplicate_index),
+                    "memory_mb": round(c.duplicate_index.memory_bytes / 1024 / 1024, 2)
+                }
+            }
+            for key, c in campaigns.items()
+        },
         "timestamp": datetime.now().isoformat()
     }
 
+@flask_app.route("/health/loop")
+def loop_health():
+    return loop_watchdog.get_stats()
+
 @flask_app.route("/go", methods=["GET"])
 def go():
-    # กำหนดลิงก์ของแต่ละบ้าน
-    LINKS = {
-        "ZOMBIE_XO":   "https://lin.ee/SgguCbJ",
-        "ZOMBIE_PG":   "https://lin.ee/ETELgrN",
-        "ZOMBIE_KING": "https://lin.ee/fJilKIf",
-        "ZOMBIE_ALL":  "https://lin.ee/9eogsb8e",
-        "GENBU88":     "https://lin.ee/JCCXt06"
-    }
-
-    # ดึงพารามิเตอร์จาก URL
+    # ดึงพารามิเตอร์จาก URL (ลิงก์เก่าที่ไม่มี campaign ใช้กิจกรรมหลัก)
     house = request.args.get("house", "").upper()
     uid   = request.args.get("uid", "")
+    campaign = campaigns.get(request.args.get("campaign", default_campaign.key))
 
     # เช็กพารามิเตอร์เบื้องต้นก่อน
-    if not house or not uid or house not in LINKS:
+    if not campaign or not house or not uid or house not in campaign.house_links:
         logger.warning(f"Invalid request: house={house}, uid={uid}")
         return "Invalid request", 400
 
-    # พยายามเชื่อมชีต
-    sheet = sheet_manager.get_sheet()
-    if sheet:
-        # อ่านข้อมูลทั้งหมด
-        records = sheet.get_all_records()
-        # หาแถวทั้งหมดที่ User ID ตรงกัน
-        matched = [
-            (row, rec)
-            for row, rec in enumerate(records, start=2)
-            if str(rec.get("User ID", "")) == str(uid)
-        ]
-
-        if matched:
-            # เอาแถวล่าสุดของ UID มาอัปเดต
-            curr_row, curr_data = matched[-1]
-
-            # เตรียมประวัติจากแถวก่อนหน้า (ถ้ามี)
-            if len(matched) > 1:
-                _, prev_data = matched[-2]
-                prev_history = prev_data.get("บ้านที่รับไปแล้ว", "") or ""
-            else:
-                prev_history = ""
-
-            prev_list = [h.strip() for h in prev_history.split(",") if h.strip()]
-            if house in prev_list:
-                prev_list.remove(house)
-
-            # 1) อัปเดต L (column 12) ให้เป็นบ้านล่าสุด
-            sheet.update_cell(curr_row, 12, house)
-            # 2) อัปเดต M (column 13) ให้เป็นประวัติใหม่
-            new_history = [house] + prev_list
-            sheet.update_cell(curr_row, 13, ", ".join(new_history))
+    # บันทึกบ้านที่เลือกลงชีตของกิจกรรม
+    update_house_in_sheet(campaign, uid, house)
 
     # ส่งต่อไปยัง LINE OA ตามบ้านที่เลือก
-    return redirect(LINKS[house], 302)
+    return redirect(campaign.house_links[house], 302)
 
 @flask_app.route("/update-house", methods=["POST"])
 def update_house():
@@ -422,12 +546,13 @@ def update_house():
         data = request.get_json()
         house = data.get("house", "").upper()
         uid = data.get("uid")
+        campaign = campaigns.get(data.get("campaign", default_campaign.key))
         
-        if house and uid:
+        if campaign and house and uid:
             user_hash = create_user_hash(uid)
             logger.info(f"API house update: {user_hash} -> {house}")
             
-            if update_house_in_sheet(uid, house):
+            if update_house_in_sheet(campaign, uid, house):
                 return {"status": "success", "house": house}, 200
             else:
                 return {"status": "failed"}, 500
@@ -439,22 +564,26 @@ def update_house():
         return {"status": "error"}, 500
 
 # ====== Background Tasks ======
-def retry_failed_saves():
+def retry_failed_saves(campaign):
     while True:
         try:
-            if pending_saves:
-                sheet = sheet_manager.get_sheet()
-                if sheet:
-                    retry_count = min(3, len(pending_saves))
-                    for _ in range(retry_count):
-                        if pending_saves:
-                            user_data = pending_saves.popleft()
-                            try:
-                                sheet.append_row(user_data)
-                                logger.info("Retry save successful")
-                            except Exception as e:
-                                failed_saves.append(user_data)
-                                logger.error(f"Retry save failed: {type(e).__name__}")
+            # บันทึกคิวให้หมดเร็วที่สุดเท่าที่โควตา Sheets ของกิจกรรมอนุญาต
+            while campaign.pending_saves:
+                sheet = campaign.get_sheet()
+                if not sheet:
+                    break
+                campaign.wait_for_budget()
+                with campaign.pending_lock:
+                    user_data = campaign.pending_saves.popleft()
+                    try:
+                        sheet.append_row(user_data)
+                        logger.info(f"Retry save successful ({campaign.key})")
+                    except Exception as e:
+                        # error ชั่วคราว (quota/เครือข่าย): ใส่กลับหัวคิวแล้วรอรอบหน้า
+                        campaign.enqueue(campaign.pending_saves, user_data, front=True)
+                        campaign.save_failures += 1
+                        logger.error(f"Retry save failed: {type(e).__name__}")
+                        break
             
             time.sleep(30)
             
@@ -462,11 +591,159 @@ def retry_failed_saves():
             logger.error(f"Background task error: {type(e).__name__}")
             time.sleep(60)
 
+def flag_duplicate_rows(campaign, flagged):
+    """เขียน flag ข้อมูลซ้ำให้ submission ที่ลงทะเบียนระหว่างสร้างดัชนี
+
+    flagged: [(user_id, registered_at, duplicates)] คืน set ของ (user_id, registered_at) ที่หาแถวไม่เจอ
+    """
+    remaining = {
+        (str(user_id), registered_at): f"DUPLICATE ({', '.join(duplicates)})"
+        for user_id, registered_at, duplicates in flagged
+    }
+    
+    # ยังอยู่ในคิวรอบันทึก: แก้ในคิวได้เลย (ถือ lock เดียวกับ retry thread
+    # แถวที่ไม่อยู่ในคิวตอนนี้จึงถูกบันทึกลง sheet เสร็จแล้ว)
+    with campaign.pending_lock:
+        for user_data in campaign.pending_saves:
+            flag = remaining.pop((user_data[8], user_data[10]), None)
+            if flag:
+                user_data[DUPLICATE_COLUMN - 1] = flag
+    if not remaining:
+        return set()
+    
+    sheet = campaign.get_sheet()
+    if not sheet:
+        return set(remaining)
+    # อ่าน I:K (User ID, สถานะกลุ่ม, เวลาลงทะเบียน) ครั้งเดียวต่อรอบ findall ของ gspread โหลดทั้ง sheet
+    campaign.wait_for_budget()
+    for offset, row in enumerate(sheet.get("I2:K")):
+        if len(row) < 3:
+            continue
+        flag = remaining.pop((row[0], row[2]), None)
+        if flag:
+            campaign.wait_for_budget()
+            sheet.update_cell(offset + 2, DUPLICATE_COLUMN, flag)
+    return set(remaining)
+
+def build_duplicate_index(campaign, attempts=3):
+    for attempt in range(1, attempts + 1):
+        try:
+            campaign.wait_for_budget()
+            for sheet in campaign.sheet_manager.get_data_sheets():
+                campaign.duplicate_index.load_worksheet(sheet, throttle=campaign.wait_for_budget)
+            flagged = campaign.duplicate_index.mark_ready()
+            logger.info(f"Duplicate index ready ({campaign.key}): {len(campaign.duplicate_index):,} entries")
+            break
+        except Exception as e:
+            logger.error(f"Duplicate index build failed ({campaign.key}, attempt {attempt}): {type(e).__name__}")
+            time.sleep(60)
+    else:
+        campaign.duplicate_index.build_failed = True
+        logger.critical(
+            f"DUPLICATE INDEX BUILD GAVE UP ({campaign.key}) after {attempts} attempts: "
+            f"duplicate check disabled, {campaign.duplicate_index.deferred} submission(s) unchecked"
+        )
+        return
+    
+    # submission ที่ลงทะเบียนระหว่างสร้างดัชนีและพบว่าซ้ำ
+    if not flagged:
+        return
+    try:
+        missing = flag_duplicate_rows(campaign, flagged)
+    except Exception as e:
+        logger.error(f"Duplicate flag failed ({campaign.key}): {type(e).__name__}")
+        return
+    for user_id, registered_at, duplicates in flagged:
+        user_hash = create_user_hash(user_id)
+        if (str(user_id), registered_at) in missing:
+            logger.error(f"Duplicate flag not written for user {user_hash} ({campaign.key})")
+        else:
+            logger.warning(f"Duplicate registration from user {user_hash}: {', '.join(duplicates)}")
+
+# ====== Status Notifications ======
+async def notify_status_change(bot, campaign, event):
+    new_status = event['new_status']
+    # บ้านที่ผู้ใช้กดเองผ่าน /go และสถานะเริ่มต้นไม่ต้องแจ้ง
+    if not new_status or new_status == "PENDING" or new_status in campaign.house_links:
+        return
+
+    user_hash = create_user_hash(event['user_id'])
+    try:
+        await bot.send_message(
+            chat_id=int(event['user_id']),
+            text=f"📢 อัปเดตสถานะการลงทะเบียน\n\nสถานะ: {new_status}"
+        )
+        logger.info(f"Status notification sent to user {user_hash}")
+    except (ValueError, TelegramError) as e:
+        logger.error(f"Status notification failed for user {user_hash}: {type(e).__name__}")
+
+async def watch_status_changes(application, campaign):
+    """หนึ่ง task ต่อกิจกรรม เพื่อไม่ให้กิจกรรมที่โควตาเต็มทำให้กิจกรรมอื่นตรวจช้าไปด้วย"""
+    def throttle():
+        return campaign.wait_for_budget(timeout=STATUS_BUDGET_WAIT)
+    
+    while True:
+        try:
+            # ทุก worksheet ข้อมูล (ข้อมูลลูกค้า, ข้อมูลลูกค้า_2, ...) StatusWatcher แยก state ตามชื่อ sheet
+            if await campaign.run_in_worker(throttle):
+                sheets = await campaign.run_in_worker(campaign.sheet_manager.get_data_sheets)
+                for sheet in sheets:
+                    events = await campaign.run_in_worker(campaign.status_watcher.poll, sheet, throttle)
+                    for event in events:
+                        await notify_status_change(application.bot, campaign, event)
+            else:
+                logger.warning(f"Status watcher: no Sheets budget ({campaign.key}), skipped this cycle")
+        except Exception as e:
+            logger.error(f"Status watcher error ({campaign.key}): {type(e).__name__}")
+
+        await asyncio.sleep(STATUS_POLL_INTERVAL)
+
+async def post_init(application):
+    loop_watchdog.start()
+    for campaign in campaigns.values():
+        application.create_task(watch_status_changes(application, campaign))
+
+async def post_shutdown(application):
+    loop_watchdog.stop()
+
 # ====== Main ======
+def build_application(token, request=None):
+    """สร้าง Application พร้อม handler ทั้งหมด (request ใช้แทน HTTP client จริงได้ เช่นใน loadtest.py)"""
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(100)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request:
+        builder = builder.request(request)
+    else:
+        builder = (
+            builder
+            .connection_pool_size(CONNECTION_POOL_SIZE)
+            .pool_timeout(POOL_TIMEOUT)
+            .read_timeout(15.0)
+            .write_timeout(15.0)
+        )
+    app = builder.build()
+    
+    app.add_error_handler(error_handler)
+    
+    conv_handler = ConversationHandler(
+        entry_points=[CommandHandler("start", start)],
+        states={ASK_INFO: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_info)]},
+        fallbacks=[CommandHandler("cancel", cancel)]
+    )
+    app.add_handler(conv_handler)
+    return app
+
 def main():
-    # Background task
-    retry_thread = Thread(target=retry_failed_saves, daemon=True)
-    retry_thread.start()
+    # Background task (หนึ่ง thread ต่อกิจกรรม)
+    for campaign in campaigns.values():
+        retry_thread = Thread(target=retry_failed_saves, args=(campaign,), daemon=True)
+        retry_thread.start()
+        Thread(target=build_duplicate_index, args=(campaign,), daemon=True).start()
     
     # Flask server
     logger.info("Starting Flask on port 10000...")
@@ -484,25 +761,7 @@ def main():
         raise ValueError("No BOT_TOKEN")
     
     try:
-        app = (
-            ApplicationBuilder()
-            .token(token)
-            .connection_pool_size(8)
-            .pool_timeout(30.0)
-            .read_timeout(15.0)
-            .write_timeout(15.0)
-            .concurrent_updates(100)
-            .build()
-        )
-        
-        app.add_error_handler(error_handler)
-        
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler("start", start)],
-            states={ASK_INFO: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_info)]},
-            fallbacks=[CommandHandler("cancel", cancel)]
-        )
-        app.add_handler(conv_handler)
+        app = build_application(token)
         
         log_memory_usage("startup")
         
@@ -0,0 +1,204 @@
+import os
+import re
+import hashlib
+import logging
+from array import array
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# คอลัมน์ใน sheet ลูกค้า (ดู user_data ใน get_info)
+PHONE_COL = "B"    # B:E = เบอร์โทร, ธนาคาร, เลขบัญชี, อีเมล
+EMAIL_COL = "E"
+USER_ID_COL = "I"
+
+
+class DuplicateIndex:
+    """ดัชนีตรวจข้อมูลซ้ำ (เบอร์โทร / เลขบัญชี / อีเมล) แบบ salted hash
+
+    เก็บเฉพาะ hash 64 บิตของค่า (ไม่เก็บค่าจริง) และ User ID เจ้าของคนแรก
+    ในตาราง open addressing บน array จึงใช้หน่วยความจำราว 21-43 ไบต์ต่อรายการ
+
+    ระหว่างที่ยังโหลดข้อมูลเก่าจาก sheet ไม่เสร็จ (ready = False) submission ใหม่
+    จะถูกพักไว้ก่อน เพื่อไม่ให้แย่งความเป็นเจ้าของจากแถวเก่า แล้วตรวจซ้ำใน mark_ready()
+    """
+
+    FIELDS = ("phone", "account", "email")
+
+    def __init__(self, salt=None, capacity=1 << 16):
+        self.salt = salt or os.getenv("DEDUP_SALT", "").encode() or os.urandom(16)
+        self.ready = False
+        self.build_failed = False
+        self._size = 0
+        self._deferred = []   # [(keys, owner, tag)] ที่รอตรวจหลังโหลดเสร็จ
+        self._growing = None  # รายการที่เพิ่มเข้ามาระหว่างขยายตาราง
+        self._lock = Lock()
+        self._keys, self._owners = self._allocate(capacity)
+        self._mask = capacity - 1
+
+    @staticmethod
+    def _allocate(capacity):
+        keys = array("Q", bytes(8 * capacity))    # 0 = ช่องว่าง
+        owners = array("q", bytes(8 * capacity))
+        return keys, owners
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def memory_bytes(self):
+        return self._keys.itemsize * len(self._keys) + self._owners.itemsize * len(self._owners)
+
+    @staticmethod
+    def normalize(field, value):
+        value = (value or "").strip()
+        if field == "email":
+            return value.lower() or None
+
+        digits = re.sub(r"\D", "", value)
+        if field == "phone" and digits.startswith("66") and len(digits) == 11:
+            digits = "0" + digits[2:]
+        return digits or None
+
+    def _hash(self, field, value):
+        digest = hashlib.blake2b(f"{field}:{value}".encode("utf-8"), key=self.salt, digest_size=8).digest()
+        return int.from_bytes(digest, "big") or 1
+
+    @staticmethod
+    def _slot(keys, mask, key):
+        slot = key & mask
+        while keys[slot] and keys[slot] != key:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _insert(self, key, owner):
+        """เรียกขณะถือ lock คืน User ID เจ้าของ (owner เองถ้าเพิ่งเพิ่ม)"""
+        slot = self._slot(self._keys, self._mask, key)
+        if self._keys[slot]:
+            return self._owners[slot]
+
+        self._keys[slot] = key
+        self._owners[slot] = owner
+        self._size += 1
+        if self._growing is not None:
+            self._growing.append((key, owner))
+        return owner
+
+    def _maybe_grow(self):
+        """ขยายตารางเมื่อ load factor เกิน 0.75 โดย rehash นอก lock แล้วค่อยสลับ array"""
+        with self._lock:
+            if self._growing is not None or self._size * 4 <= len(self._keys) * 3:
+                return
+            self._growing = []
+            keys, owners = self._keys, self._owners
+
+        capacity = len(keys) * 2
+        mask = capacity - 1
+        new_keys, new_owners = self._allocate(capacity)
+        for key, owner in zip(keys, owners):
+            if key:
+                slot = self._slot(new_keys, mask, key)
+                new_keys[slot] = key
+                new_owners[slot] = owner
+
+        with self._lock:
+            # รายการที่เพิ่มระหว่าง rehash (ถ้ายังไม่มีในตารางใหม่)
+            for key, owner in self._growing:
+                slot = self._slot(new_keys, mask, key)
+                if not new_keys[slot]:
+                    new_keys[slot] = key
+                    new_owners[slot] = owner
+            self._keys, self._owners, self._mask = new_keys, new_owners, mask
+            self._growing = None
+
+    def _keys_for(self, record):
+        """{field: value} -> [(field, hash)] เฉพาะช่องที่มีค่า"""
+        keys = []
+        for field in self.FIELDS:
+            value = self.normalize(field, record.get(field))
+            if value:
+                keys.append((field, self._hash(field, value)))
+        return keys
+
+    def check_and_add(self, record, owner, tag=None):
+        """เพิ่มข้อมูลของ owner และคืนรายชื่อช่องที่ซ้ำกับผู้ใช้คนอื่น
+
+        ถ้ายังไม่ ready จะพักไว้และคืน [] ผลจริงได้จาก mark_ready() พร้อม tag ที่ส่งมา
+        """
+        owner = int(owner)
+        keys = self._keys_for(record)
+        with self._lock:
+            if not self.ready:
+                self._deferred.append((keys, owner, tag))
+                return []
+            duplicates = [field for field, key in keys if self._insert(key, owner) != owner]
+        self._maybe_grow()
+        return duplicates
+
+    def mark_ready(self):
+        """เรียกเมื่อโหลดข้อมูลเก่าครบ ตรวจ submission ที่พักไว้ตามลำดับ
+
+        คืน [(owner, tag, duplicates)] ของ submission ที่พบว่าซ้ำ
+        """
+        flagged = []
+        with self._lock:
+            for keys, owner, tag in self._deferred:
+                duplicates = [field for field, key in keys if self._insert(key, owner) != owner]
+                if duplicates:
+                    flagged.append((owner, tag, duplicates))
+            self._deferred = []
+            self.ready = True
+        self._maybe_grow()
+        return flagged
+
+    @property
+    def deferred(self):
+        return len(self._deferred)
+
+    def add_rows(self, rows):
+        """เพิ่มแถวจาก sheet: [(phone, account, email, user_id), ...]"""
+        entries = []
+        for phone, account, email, user_id in rows:
+            try:
+                owner = int(user_id)
+            except (TypeError, ValueError):
+                continue
+            record = {"phone": phone, "account": account, "email": email}
+            entries.extend((key, owner) for _, key in self._keys_for(record))
+
+        # hash นอก lock และเพิ่มทีละส่วนเพื่อไม่ให้ check_and_add ต้องรอนาน
+        for i in range(0, len(entries), 500):
+            with self._lock:
+                for key, owner in entries[i:i + 500]:
+                    self._insert(key, owner)
+            self._maybe_grow()
+
+    def load_worksheet(self, sheet, page_size=5000, throttle=None):
+        """อ่านคอลัมน์เบอร์โทร/เลขบัญชี/อีเมล/User ID ของ sheet ทีละ page_size แถว
+
+        throttle (ถ้ามี) ถูกเรียกก่อนทุก request เพื่อรอโควตา Sheets
+        """
+        loaded = 0
+        start = 2
+        while start <= sheet.row_count:
+            end = start + page_size - 1
+            if throttle:
+                throttle()
+            details, user_ids = sheet.batch_get(
+                [f"{PHONE_COL}{start}:{EMAIL_COL}{end}", f"{USER_ID_COL}{start}:{USER_ID_COL}{end}"]
+            )
+            start = end + 1
+            if not details:
+                continue  # หน้าว่าง (เช่นแถวที่ถูกล้างกลางชีต) ยังมีข้อมูลในหน้าถัดไปได้
+
+            rows = []
+            for offset, row in enumerate(details):
+                row = list(row) + [""] * 4
+                user_id = user_ids[offset][0] if offset < len(user_ids) and user_ids[offset] else ""
+                rows.append((row[0], row[2], row[3], user_id))
+            self.add_rows(rows)
+
+            loaded += len(rows)
+
+        logger.info(f"Duplicate index: loaded {loaded:,} rows from {sheet.title}")
+        return loaded
@@ -0,0 +1,259 @@
+"""Load test การลงทะเบียน (start -> ASK_INFO -> get_info) แบบ end-to-end
+
+ส่ง Update จำลองของผู้ใช้หลายพันคนเข้า Application ตัวเดียวกับที่ main() สร้าง
+โดยใช้ Bot API จำลองในเครื่อง (getMe / getChatMember / sendMessage) และ sheet จำลอง
+
+    python loadtest.py --users 2000 --spawn-rate 500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.error import TimedOut
+from telegram.request import BaseRequest
+
+import bot
+
+FAKE_TOKEN = "123456:LOADTEST"
+
+INFO_TEXT = (
+    "ชื่อ - นามสกุล : ทดสอบ {uid}\n"
+    "เบอร์โทร : 08{uid:08d}\n"
+    "ธนาคาร : ทดสอบ\n"
+    "เลขบัญชี : {uid:010d}\n"
+    "อีเมล : loadtest{uid}@example.com\n"
+    "ชื่อเทเลแกรม : ทดสอบ\n"
+    "@username Telegram : @loadtest{uid}"
+)
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API จำลอง จำกัดจำนวน connection เหมือน pool ของ HTTPXRequest"""
+
+    def __init__(self, pool_size=bot.CONNECTION_POOL_SIZE, pool_timeout=bot.POOL_TIMEOUT, latency=0.05):
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.latency = latency
+        self.pool_timeouts = 0
+        self.calls = defaultdict(int)
+        self.waiters = {}  # {chat_id: future ที่รอข้อความตอบกลับ}
+        self._pool = None
+        self._message_id = 0
+
+    async def initialize(self):
+        self._pool = asyncio.Semaphore(self.pool_size)
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if not isinstance(pool_timeout, (int, float)):
+            pool_timeout = self.pool_timeout
+
+        try:
+            await asyncio.wait_for(self._pool.acquire(), timeout=pool_timeout)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            raise TimedOut("Pool timeout: All connections in the connection pool are occupied.")
+
+        try:
+            await asyncio.sleep(self.latency)
+            endpoint = url.rsplit("/", 1)[-1]
+            params = request_data.parameters if request_data else {}
+            self.calls[endpoint] += 1
+            result = self._handle(endpoint, params)
+        finally:
+            self._pool.release()
+
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+    def _handle(self, endpoint, params):
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+
+        if endpoint == "getChatMember":
+            return {
+                "status": "member",
+                "user": {"id": int(params["user_id"]), "is_bot": False, "first_name": "User"}
+            }
+
+        if endpoint == "sendMessage":
+            self._message_id += 1
+            chat_id = int(params["chat_id"])
+            text = params.get("text", "")
+            waiter = self.waiters.pop(chat_id, None)
+            if waiter and not waiter.done():
+                waiter.set_result(text)
+            return {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": text
+            }
+
+        return True
+
+
+class FakeSheet:
+    """worksheet จำลอง: append_row บล็อก thread เหมือน gspread จริง"""
+
+    title = "ข้อมูลลูกค้า"
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.rows = []
+
+    def append_row(self, values):
+        time.sleep(self.latency)
+        self.rows.append(values)
+
+
+class FakeSheetManager:
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def get_sheet(self):
+        return self.sheet
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoadTest:
+    def __init__(self, app, api, reply_timeout):
+        self.app = app
+        self.api = api
+        self.reply_timeout = reply_timeout
+        self.update_id = 0
+        self.latencies = {"start": [], "get_info": []}
+        self.replies = 0
+        self.rate_limited = 0
+        self.no_reply = 0
+
+    def _make_update(self, uid, text):
+        self.update_id += 1
+        message = {
+            "message_id": self.update_id,
+            "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": f"User{uid}", "username": f"loadtest{uid}"},
+            "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": self.update_id, "message": message}, self.app.bot)
+
+    async def _send(self, uid, text, step):
+        """ส่ง update แล้วรอข้อความตอบกลับ คืนข้อความหรือ None ถ้าไม่มีคำตอบ"""
+        waiter = asyncio.get_running_loop().create_future()
+        self.api.waiters[uid] = waiter
+        started = time.perf_counter()
+        await self.app.update_queue.put(self._make_update(uid, text))
+
+        try:
+            reply = await asyncio.wait_for(waiter, timeout=self.reply_timeout)
+        except asyncio.TimeoutError:
+            self.api.waiters.pop(uid, None)
+            self.no_reply += 1
+            return None
+
+        self.latencies[step].append(time.perf_counter() - started)
+        if reply.startswith("⏱️"):
+            self.rate_limited += 1
+            return None
+        return reply
+
+    async def simulate_user(self, uid, delay, rounds):
+        await asyncio.sleep(delay)
+        for _ in range(rounds):
+            if await self._send(uid, "/start", "start") is None:
+                continue
+            if await self._send(uid, INFO_TEXT.format(uid=uid), "get_info") is not None:
+                self.replies += 1
+
+
+async def run(args):
+    api = FakeBotAPI(pool_size=args.pool_size, pool_timeout=args.pool_timeout, latency=args.api_latency)
+    sheet = FakeSheet(latency=args.sheet_latency)
+    for campaign in bot.campaigns.values():
+        campaign.sheet_manager = FakeSheetManager(sheet)
+        campaign.duplicate_index.mark_ready()  # sheet จำลองว่าง ไม่มีข้อมูลเก่าให้โหลด
+        if args.sheets_budget:
+            campaign.sheets_budget.max_requests = args.sheets_budget
+
+    app = bot.build_application(FAKE_TOKEN, request=api)
+    await app.initialize()
+    await app.start()
+    bot.loop_watchdog.start()
+
+    test = LoadTest(app, api, reply_timeout=args.reply_timeout)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            test.simulate_user(1_000_000 + i, i / args.spawn_rate, args.rounds)
+            for i in range(args.users)
+        ))
+    finally:
+        elapsed = time.perf_counter() - started
+        bot.loop_watchdog.stop()
+        await app.stop()
+        await app.shutdown()
+
+    print(f"users: {args.users} x {args.rounds} round(s) in {elapsed:.1f}s")
+    # get_info ตอบกลับแม้แถวจะยังค้างอยู่ใน pending_saves จึงนับแถวที่บันทึกจริงแยกต่างหาก
+    print(f"saved registrations: {len(sheet.rows)} ({len(sheet.rows) / elapsed:.1f}/s)")
+    print(f"get_info replies: {test.replies} ({test.replies / elapsed:.1f}/s)")
+    for step, values in test.latencies.items():
+        print(
+            f"{step} latency: p50={percentile(values, 50) * 1000:.0f}ms "
+            f"p99={percentile(values, 99) * 1000:.0f}ms (n={len(values)})"
+        )
+    print(f"pool timeouts: {api.pool_timeouts}")
+    print(f"rate-limit rejections: {test.rate_limited}")
+    print(f"no reply within {args.reply_timeout:.0f}s: {test.no_reply}")
+    print(f"API calls: {dict(api.calls)}")
+    for key, campaign in bot.campaigns.items():
+        print(
+            f"campaign {key}: pending={len(campaign.pending_saves)} "
+            f"failed={campaign.save_failures} dropped={campaign.dropped_saves}"
+        )
+
+    loop_stats = bot.loop_watchdog.get_stats()
+    print(f"loop lag: {loop_stats['lag_ms']} stalls: {loop_stats['stalls']}")
+    for entry in loop_stats["stall_sites"]:
+        print(f"  {entry['count']:>5}  {entry['site']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test การลงทะเบียนกับ Bot API จำลอง")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--spawn-rate", type=float, default=200.0, help="ผู้ใช้ใหม่ต่อวินาที")
+    parser.add_argument("--rounds", type=int, default=1, help="จำนวนครั้งที่ผู้ใช้แต่ละคนลงทะเบียน")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="วินาทีต่อ Bot API call")
+    parser.add_argument("--sheet-latency", type=float, default=0.2, help="วินาทีต่อ append_row")
+    parser.add_argument("--sheets-budget", type=int, default=None, help="Sheets requests/นาที ต่อกิจกรรม (ค่าเริ่มต้นตาม config)")
+    parser.add_argument("--pool-size", type=int, default=bot.CONNECTION_POOL_SIZE)
+    parser.add_argument("--pool-timeout", type=float, default=bot.POOL_TIMEOUT)
+    parser.add_argument("--reply-timeout", type=float, default=30.0)
+    parser.add_argument("--verbose", action="store_true", help="แสดง log ของ bot (ค่าเริ่มต้นแสดงเฉพาะสรุป)")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # แสดงเฉพาะสรุปผล (ไม่งั้น warning ต่อแถวที่เข้าคิวจะกลบสรุป)
+        logging.disable(logging.CRITICAL)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import traceback
+from threading import Thread, Lock, Event, get_ident
+from collections import deque, Counter
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class LoopWatchdog:
+    """วัด lag ของ asyncio event loop และจับ stack ของโค้ดที่บล็อก loop
+
+    heartbeat task บน loop ตื่นทุก interval วินาทีและบันทึกว่าตื่นช้ากว่ากำหนดเท่าไร
+    ส่วน monitor thread คอยดูว่า heartbeat หยุดนานเกิน threshold หรือไม่
+    ถ้าใช่จะจับ stack ของ thread ที่รัน loop ตอนที่ยังบล็อกอยู่
+    """
+
+    def __init__(self, interval=0.1, threshold=1.0, max_samples=1000):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_samples = deque(maxlen=max_samples)
+        self.stall_sites = Counter()
+        self.stalls = 0
+        self._lock = Lock()
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = None
+        self._task = None
+        self._stop_event = Event()
+
+    def start(self):
+        """เรียกจากใน event loop ที่ต้องการวัด (เช่น post_init ของ Application)"""
+        if self._task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event = Event()
+        self._task = self._loop.create_task(self._heartbeat())
+        Thread(target=self._monitor, args=(self._stop_event,), daemon=True).start()
+        logger.info(f"Loop watchdog started (threshold {self.threshold:.1f}s)")
+
+    def stop(self):
+        """หยุด heartbeat และ monitor thread (เรียกจากใน loop ก่อน loop ปิด เช่น post_shutdown)"""
+        if not self._task:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        self._task = None
+        logger.info("Loop watchdog stopped")
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                self.lag_samples.append(max(0.0, now - before - self.interval))
+            self._last_beat = now
+
+    def _monitor(self, stop_event):
+        stalled_beat = None
+        while not stop_event.wait(self.interval / 2):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat
+
+            # loop ไม่ได้รัน (เช่น ระหว่าง startup/shutdown ของ PTB) ไม่ใช่การบล็อก
+            if not self._loop.is_running():
+                stalled_beat = last_beat
+                continue
+
+            # แจ้งครั้งเดียวต่อการบล็อกหนึ่งครั้ง
+            if blocked_for < self.threshold or stalled_beat == last_beat:
+                continue
+            stalled_beat = last_beat
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._record_stall(traceback.extract_stack(frame), blocked_for)
+
+    @staticmethod
+    def _call_site(stack):
+        """frame ในสุดที่เป็นโค้ดของโปรเจกต์ (ไม่ใช่ library)"""
+        for entry in reversed(stack):
+            path = os.path.abspath(entry.filename)
+            if path.startswith(PROJECT_ROOT) and "site-packages" not in path:
+                return f"{os.path.relpath(path, PROJECT_ROOT)}:{entry.lineno} {entry.name}"
+        entry = stack[-1]
+        return f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+
+    def _record_stall(self, stack, blocked_for):
+        site = self._call_site(stack)
+        with self._lock:
+            self.stalls += 1
+            self.stall_sites[site] += 1
+
+        # บันทึกเฉพาะไฟล์/บรรทัด/ฟังก์ชัน ไม่บันทึก source หรือค่าตัวแปร
+        frames = "\n".join(
+            f"  {os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
+            for entry in stack[-15:]
+        )
+        logger.warning(f"Event loop blocked {blocked_for:.2f}s at {site}\n{frames}")
+
+    @staticmethod
+    def _percentile(ordered, pct):
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def get_stats(self):
+        with self._lock:
+            ordered = sorted(self.lag_samples)
+            top_sites = self.stall_sites.most_common(10)
+            stalls = self.stalls
+
+        return {
+            "samples": len(ordered),
+            "lag_ms": {
+                "p50": round(self._percentile(ordered, 50) * 1000, 1),
+                "p95": round(self._percentile(ordered, 95) * 1000, 1),
+                "p99": round(self._percentile(ordered, 99) * 1000, 1),
+                "max": round((ordered[-1] if ordered else 0.0) * 1000, 1)
+            },
+            "threshold_ms": round(self.threshold * 1000),
+            "stalls": stalls,
+            "stall_sites": [{"site": site, "count": count} for site, count in top_sites]
+        }
@@ -0,0 +1,109 @@
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# คอลัมน์ที่ bot เขียนไว้ตอนลงทะเบียน (ดู user_data ใน get_info)
+# I = User ID, J = สถานะกลุ่ม, K = เวลาลงทะเบียน, L = สถานะ, M = บ้านที่รับไปแล้ว
+WATCH_RANGE = "I2:M"
+FIRST_ROW = 2
+USER_ID = 0
+REGISTERED_AT = 2
+STATUS = 3
+
+
+class StatusWatcher:
+    """ตรวจจับการเปลี่ยนแปลงคอลัมน์สถานะแบบ incremental
+
+    อ่านเฉพาะคอลัมน์ I:M ครั้งเดียวต่อรอบ (ขนาดตามข้อมูลจริง ไม่ใช่ขนาด grid)
+    แล้วแบ่งเป็น block ละ page_size แถว block ไหน checksum ไม่เปลี่ยนจะไม่ถูก
+    ประมวลผลซ้ำ สถานะเดิมถูกเทียบตาม submission (User ID + เวลาลงทะเบียน)
+    ไม่ใช่ตามเลขแถว จึงไม่เกิด event ปลอมเมื่อแอดมินลบ แทรก หรือเรียงแถวใหม่
+    """
+
+    def __init__(self, page_size=500):
+        self.page_size = page_size
+        self._checksums = {}  # {sheet title: {block start row: checksum}}
+        self._blocks = {}     # {sheet title: {block start row: [(user id, registered at, status), ...]}}
+        self._statuses = {}   # {sheet title: {(user id, registered at): (row, status)}}
+
+    @staticmethod
+    def _checksum(rows):
+        return hashlib.md5(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(values):
+        """แปลงแถวจาก Sheets API (ที่ตัดช่องว่างท้ายทิ้ง) ให้เป็น [(user id, registered at, status), ...]"""
+        rows = []
+        for row in values:
+            row = [cell.strip() for cell in row] + [""] * 5
+            rows.append((row[USER_ID], row[REGISTERED_AT], row[STATUS]))
+        return rows
+
+    def poll(self, sheet, throttle=None):
+        """อ่านสถานะรอบใหม่และคืนรายการ event ของ submission ที่สถานะเปลี่ยน
+
+        รอบแรกของแต่ละ sheet ใช้เป็น baseline จึงไม่มี event
+        throttle (ถ้ามี) ถูกเรียกก่อน request ถ้าคืน False จะข้ามรอบนี้
+        """
+        if throttle and not throttle():
+            logger.warning(f"Status watcher: no Sheets budget, skipped {sheet.title}")
+            return []
+
+        title = sheet.title
+        first_poll = title not in self._checksums
+        checksums = self._checksums.setdefault(title, {})
+        blocks = self._blocks.setdefault(title, {})
+        statuses = self._statuses.setdefault(title, {})
+
+        values = sheet.get(WATCH_RANGE)
+        new_blocks = {
+            FIRST_ROW + offset: self._normalize(values[offset:offset + self.page_size])
+            for offset in range(0, len(values), self.page_size)
+        }
+
+        # submission จาก block ที่เปลี่ยนหรือหายไป (sheet สั้นลง) เทียบกับของใหม่
+        removed = {}
+        added = {}
+        for start in set(blocks) | set(new_blocks):
+            rows = new_blocks.get(start)
+            checksum = self._checksum(rows) if rows is not None else None
+            if checksum is not None and checksums.get(start) == checksum:
+                continue
+
+            for offset, (user_id, registered_at, status) in enumerate(blocks.get(start, [])):
+                if user_id:
+                    removed[(user_id, registered_at)] = (start + offset, status)
+            for offset, (user_id, registered_at, status) in enumerate(rows or []):
+                if user_id:
+                    added[(user_id, registered_at)] = (start + offset, status)
+
+            if rows is None:
+                del checksums[start]
+                del blocks[start]
+            else:
+                checksums[start] = checksum
+                blocks[start] = rows
+
+        for key in removed:
+            statuses.pop(key, None)
+        statuses.update(added)
+        if first_poll or not added:
+            return []
+
+        # submission ใหม่ (ต่อท้าย) หรือที่ถูกลบไม่นับเป็นการเปลี่ยนสถานะ
+        events = []
+        for (user_id, registered_at), (row, status) in added.items():
+            old = removed.get((user_id, registered_at))
+            if old and old[1] != status:
+                events.append({
+                    'sheet': title,
+                    'row': row,
+                    'user_id': user_id,
+                    'old_status': old[1],
+                    'new_status': status
+                })
+
+        logger.info(f"Status watcher: {len(events)} change(s) in {title}")
+        return events
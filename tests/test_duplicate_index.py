@@ -0,0 +1,144 @@
+import unittest
+
+from duplicate_index import DuplicateIndex
+
+
+def record(phone="", account="", email=""):
+    return {"phone": phone, "account": account, "email": email}
+
+
+class GrowHookIndex(DuplicateIndex):
+    """เรียก on_rehash ครั้งเดียวระหว่างคัดลอกเข้าตารางใหม่ (นอก lock) เพื่อจำลองการเพิ่มข้อมูลพร้อมกับการขยายตาราง"""
+
+    on_rehash = None
+
+    def _slot(self, keys, mask, key):
+        if self.on_rehash and keys is not self._keys:
+            hook, self.on_rehash = self.on_rehash, None
+            hook()
+        return DuplicateIndex._slot(keys, mask, key)
+
+
+class FakeSheet:
+    title = "ข้อมูลลูกค้า"
+
+    def __init__(self, pages, row_count):
+        self.pages = pages  # {start row: (details, user_ids)}
+        self.row_count = row_count
+        self.requests = 0
+
+    def batch_get(self, ranges):
+        self.requests += 1
+        start = int(ranges[0].split(":")[0][1:])
+        return self.pages.get(start, ([], []))
+
+
+class DuplicateIndexTest(unittest.TestCase):
+    def make_index(self, capacity=1 << 16, cls=DuplicateIndex):
+        index = cls(salt=b"test-salt", capacity=capacity)
+        index.mark_ready()
+        return index
+
+    def test_normalize(self):
+        self.assertEqual(DuplicateIndex.normalize("phone", "+66 81-234-5678"), "0812345678")
+        self.assertEqual(DuplicateIndex.normalize("account", "123-4-56789-0"), "1234567890")
+        self.assertEqual(DuplicateIndex.normalize("email", " A@Example.com "), "a@example.com")
+        self.assertIsNone(DuplicateIndex.normalize("phone", " - "))
+
+    def test_duplicate_from_other_user(self):
+        index = self.make_index()
+        self.assertEqual(index.check_and_add(record("0812345678", "111", "a@x.com"), 1), [])
+        self.assertEqual(index.check_and_add(record("+66812345678", "222", "A@X.com"), 2), ["phone", "email"])
+        self.assertEqual(len(index), 4)
+
+    def test_same_owner_is_not_duplicate(self):
+        index = self.make_index()
+        index.check_and_add(record("0812345678", "111"), 1)
+        self.assertEqual(index.check_and_add(record("0812345678", "111"), 1), [])
+
+    def test_collisions_probe_to_next_slot(self):
+        index = self.make_index(capacity=8)
+        keys = [8 * i + 3 for i in range(1, 5)]  # key ต่างกันแต่ลงช่อง 3 เหมือนกัน ต้อง probe ต่อ
+        with index._lock:
+            for owner, key in enumerate(keys, start=1):
+                self.assertEqual(index._insert(key, owner), owner)
+            for owner, key in enumerate(keys, start=1):
+                self.assertEqual(index._insert(key, 99), owner)
+        self.assertEqual(len(index), 4)
+
+    def test_grow_keeps_every_entry(self):
+        index = self.make_index(capacity=8)
+        for i in range(200):
+            index.check_and_add(record(f"08{i:08d}"), i + 1)
+
+        self.assertEqual(len(index), 200)
+        self.assertGreaterEqual(len(index._keys) * 3, len(index) * 4)
+        for i in range(200):
+            self.assertEqual(index.check_and_add(record(f"08{i:08d}"), 10_000), ["phone"])
+
+    def test_grow_replays_entries_added_during_rehash(self):
+        index = self.make_index(capacity=8, cls=GrowHookIndex)
+        for i in range(6):
+            index.check_and_add(record(f"08{i:08d}"), i + 1)
+        self.assertEqual(len(index._keys), 8)
+
+        # เพิ่มระหว่าง rehash: ต้องไม่หายหลังสลับไปใช้ตารางใหม่
+        added = []
+        index.on_rehash = lambda: added.append(
+            (index._growing is not None, index.check_and_add(record("0899999999"), 77))
+        )
+        index.check_and_add(record("0800000006"), 7)
+
+        self.assertEqual(added, [(True, [])])
+        self.assertEqual(len(index._keys), 16)
+        self.assertIsNone(index._growing)
+        self.assertEqual(index.check_and_add(record("0899999999"), 78), ["phone"])
+        for i in range(7):
+            self.assertEqual(index.check_and_add(record(f"08{i:08d}"), 10_000), ["phone"])
+
+    def test_deferred_until_ready_and_checked_in_order(self):
+        index = DuplicateIndex(salt=b"test-salt")
+        self.assertEqual(index.check_and_add(record("0811111111"), 2, tag="t2"), [])
+        self.assertEqual(index.check_and_add(record("0811111111"), 3, tag="t3"), [])
+        self.assertEqual(index.deferred, 2)
+
+        # แถวเก่าจาก sheet เป็นเจ้าของก่อน submission ที่พักไว้
+        index.add_rows([("0811111111", "", "", "1")])
+        self.assertEqual(
+            index.mark_ready(),
+            [(2, "t2", ["phone"]), (3, "t3", ["phone"])]
+        )
+        self.assertTrue(index.ready)
+        self.assertEqual(index.deferred, 0)
+
+    def test_deferred_first_submission_owns_new_value(self):
+        index = DuplicateIndex(salt=b"test-salt")
+        index.check_and_add(record(email="new@x.com"), 2, tag="first")
+        index.check_and_add(record(email="new@x.com"), 3, tag="second")
+        self.assertEqual(index.mark_ready(), [(3, "second", ["email"])])
+
+    def test_load_worksheet_skips_empty_pages(self):
+        index = DuplicateIndex(salt=b"test-salt")
+        sheet = FakeSheet({
+            2: ([["0811111111", "", "111"]], [["1"]]),
+            # แถว 4-5 ว่าง (ถูกล้างกลางชีต)
+            6: ([["0822222222", "", "222", "b@x.com"]], [["2"]]),
+        }, row_count=7)
+        throttled = []
+
+        loaded = index.load_worksheet(sheet, page_size=2, throttle=lambda: throttled.append(1))
+        index.mark_ready()
+
+        self.assertEqual(loaded, 2)
+        self.assertEqual(sheet.requests, 3)
+        self.assertEqual(len(throttled), 3)
+        self.assertEqual(index.check_and_add(record("0822222222"), 9), ["phone"])
+
+    def test_add_rows_skips_invalid_user_id(self):
+        index = self.make_index()
+        index.add_rows([("0811111111", "", "", ""), ("0822222222", "", "", "abc")])
+        self.assertEqual(len(index), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()